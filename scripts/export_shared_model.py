@@ -0,0 +1,36 @@
+"""
+导出共享内存模型（多 worker 部署用）
+运行：python scripts/export_shared_model.py [模型路径] [导出目录]
+
+父进程只加载一次 pickle 模型，把矩阵写成 .npy 文件；
+各 worker 设置 MOVIEMATE_SHARED_MODEL_DIR 后以 mmap 只读映射，
+内存占用不再随 worker 数量成倍增长。
+"""
+import sys
+import os
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.models.collaborative_filtering import CollaborativeFilteringRecommender
+
+DEFAULT_MODEL_PATH = 'data/models/cf_model.pkl'
+DEFAULT_SHARED_DIR = 'data/models/shared'
+
+def main():
+    model_path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_MODEL_PATH
+    shared_dir = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_SHARED_DIR
+
+    if not os.path.exists(model_path):
+        print(f"❌ 模型文件不存在: {model_path}")
+        print("   请先运行: python scripts/train_model.py")
+        sys.exit(1)
+
+    model = CollaborativeFilteringRecommender.load(model_path)
+    model.export_shared(shared_dir)
+
+    print("\n下一步: 多 worker 启动 API")
+    print(f"  MOVIEMATE_SHARED_MODEL_DIR={shared_dir} uvicorn src.api.main:app --workers 4")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+API 压测工具
+按真实的用户/电影ID分布混合调用各接口，统计吞吐量和延迟分位数
+
+运行（进程内直接驱动 FastAPI 应用，无需启动服务）：
+    python scripts/load_test.py --requests 2000 --concurrency 32
+压测已启动的服务：
+    python scripts/load_test.py --url http://127.0.0.1:8000
+
+两种方式都会在本地加载 data/ 下的模型和电影数据，用于生成请求ID。
+注意：压测远程服务时 /feedback 请求会写入该服务的反馈记录，
+可通过 --mix 去掉 feedback，或让被测服务设置 MOVIEMATE_FEEDBACK_PATH。
+"""
+import sys
+import os
+import time
+import json
+import random
+import asyncio
+import argparse
+from urllib.parse import quote
+from collections import defaultdict
+import numpy as np
+import httpx
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.api import main as api
+
+# 默认请求比例（接口名=权重）
+DEFAULT_MIX = "recommend=50,similar=20,predict=15,search=10,feedback=5"
+ENDPOINTS = ("recommend", "similar", "predict", "search", "feedback")
+NEW_USER_RATE = 0.05  # 冷启动用户占比
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="MovieMate API 压测")
+    parser.add_argument('--url', default=None,
+                        help="被测服务地址；不指定则在进程内驱动应用")
+    parser.add_argument('--requests', type=int, default=1000,
+                        help="总请求数（默认1000）")
+    parser.add_argument('--concurrency', type=int, default=16,
+                        help="并发数（默认16）")
+    parser.add_argument('--mix', default=DEFAULT_MIX,
+                        help=f"接口权重，默认 {DEFAULT_MIX}")
+    parser.add_argument('--top-k', type=int, default=10,
+                        help="推荐/相似接口的 top_k（默认10）")
+    parser.add_argument('--seed', type=int, default=42,
+                        help="随机种子（保证请求序列可复现）")
+    parser.add_argument('--output', default=None,
+                        help="把结果写入 JSON 文件（用于回归对比）")
+    args = parser.parse_args()
+
+    # 在加载模型之前校验参数，避免等待加载完才报错
+    if args.requests < 1:
+        parser.error(f"--requests 至少为 1: {args.requests}")
+    if args.concurrency < 1:
+        parser.error(f"--concurrency 至少为 1: {args.concurrency}")
+    try:
+        args.mix_weights = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+def parse_mix(mix):
+    """解析 --mix（如 recommend=50,similar=20），返回 [(接口名, 权重), ...]"""
+    weights = []
+    for item in mix.split(','):
+        name, sep, weight = item.partition('=')
+        name = name.strip()
+        if not sep:
+            raise ValueError(f"--mix 的每一项必须是 接口名=权重: {item}")
+        if name not in ENDPOINTS:
+            raise ValueError(f"未知接口: {name}（可选: {', '.join(ENDPOINTS)}）")
+        try:
+            value = float(weight)
+        except ValueError:
+            raise ValueError(f"接口 {name} 的权重不是数字: {weight}")
+        if not value > 0:
+            raise ValueError(f"接口 {name} 的权重必须大于 0: {weight}")
+        weights.append((name, value))
+    return weights
+
+class RequestFactory:
+    """从真实ID空间中生成请求"""
+
+    def __init__(self, model, movies_df, mix, top_k, seed):
+        """mix: parse_mix 返回的 [(接口名, 权重), ...]"""
+        self.rng = random.Random(seed)
+        self.top_k = top_k
+        self.user_ids = list(model.user_ids)
+        self.max_user_id = max(self.user_ids)
+        self.movie_ids = list(model.movie_ids)
+        # 电影按评分次数加权抽样，接近真实的热门分布
+        counts = np.asarray((model.user_item_matrix.values > 0).sum(axis=0), dtype=float)
+        self.movie_weights = (counts + 1).tolist()
+        self.search_terms = [title.split(' ')[0] for title in movies_df['title'].dropna()]
+
+        self.endpoints = [name for name, _ in mix]
+        self.weights = [weight for _, weight in mix]
+
+    def _user(self):
+        if self.rng.random() < NEW_USER_RATE:
+            return self.max_user_id + self.rng.randint(1, 1000)
+        return self.rng.choice(self.user_ids)
+
+    def _movie(self):
+        return self.rng.choices(self.movie_ids, weights=self.movie_weights)[0]
+
+    def _recommend(self):
+        return "GET", f"/recommend/{self._user()}", {"top_k": self.top_k}
+
+    def _similar(self):
+        return "GET", f"/similar/{self._movie()}", {"top_k": self.top_k}
+
+    def _predict(self):
+        return "GET", "/predict", {"user_id": self._user(), "movie_id": self._movie()}
+
+    def _search(self):
+        # 标题里可能有 / # ? 等字符（如 Face/Off），必须转义后放进路径
+        term = quote(self.rng.choice(self.search_terms), safe='')
+        return "GET", f"/movies/search/{term}", {"limit": 10}
+
+    def _feedback(self):
+        return "POST", "/feedback", {
+            "user_id": self._user(),
+            "movie_id": self._movie(),
+            "liked": self.rng.random() < 0.5,
+            "strategy": "collaborative"
+        }
+
+    def next(self):
+        """返回 (接口名, 方法, 路径, 参数)"""
+        name = self.rng.choices(self.endpoints, weights=self.weights)[0]
+        method, path, params = getattr(self, f"_{name}")()
+        return name, method, path, params
+
+async def run_load(client, factory, total, concurrency):
+    """并发执行请求，返回每个接口的延迟和错误数"""
+    # 预先生成请求序列，保证不同并发数下请求内容一致
+    plan = [factory.next() for _ in range(total)]
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    cursor = iter(plan)
+
+    async def worker():
+        for name, method, path, params in cursor:
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, params=params)
+                failed = not response.is_success
+            except Exception:
+                # 进程内 ASGITransport 会直接抛出应用异常，记为错误而不是中断压测
+                failed = True
+            latencies[name].append(time.perf_counter() - started)
+            if failed:
+                errors[name] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return latencies, errors, elapsed
+
+def _latency_row(values, error_count, elapsed):
+    """单行统计；没有样本时分位数为 None"""
+    row = {
+        "count": len(values),
+        "errors": error_count,
+        "rps": len(values) / elapsed if elapsed > 0 else 0.0,
+    }
+    ms = np.asarray(values) * 1000
+    for q in (50, 95, 99):
+        row[f"p{q}_ms"] = float(np.percentile(ms, q)) if len(ms) else None
+    return row
+
+def summarize(latencies, errors, elapsed):
+    """计算每个接口的 RPS 和 p50/p95/p99（毫秒）"""
+    report = {}
+    all_latencies = []
+    for name, values in sorted(latencies.items()):
+        all_latencies.extend(values)
+        report[name] = _latency_row(values, errors[name], elapsed)
+    report["total"] = _latency_row(all_latencies, sum(errors.values()), elapsed)
+    return report
+
+def print_report(report, elapsed):
+    print("\n" + "=" * 72)
+    print(f"{'接口':<12}{'请求数':>8}{'错误':>6}{'RPS':>10}{'p50(ms)':>11}{'p95(ms)':>11}{'p99(ms)':>11}")
+    print("-" * 72)
+    for name, row in report.items():
+        percentiles = "".join(
+            f"{'-':>11}" if row[key] is None else f"{row[key]:>11.2f}"
+            for key in ('p50_ms', 'p95_ms', 'p99_ms')
+        )
+        print(f"{name:<12}{row['count']:>8}{row['errors']:>6}{row['rps']:>10.1f}{percentiles}")
+    print("=" * 72)
+    print(f"总耗时: {elapsed:.2f} 秒")
+
+async def main():
+    args = parse_args()
+
+    print("=" * 72)
+    print("MovieMate - API 压测")
+    print("=" * 72)
+
+    # 加载本地模型和电影数据（生成请求ID；进程内模式同时作为被测应用的状态）
+    await api.load_model()
+    if api.model is None:
+        sys.exit(1)
+
+    factory = RequestFactory(api.model, api.movies_df, args.mix_weights, args.top_k, args.seed)
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=30)
+        target = args.url
+    else:
+        # 压测产生的反馈不能混入隐式反馈训练数据
+        api.FEEDBACK_PATH = os.devnull
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=api.app),
+                                   base_url="http://moviemate", timeout=30)
+        target = "进程内应用"
+
+    print(f"\n目标: {target}")
+    print(f"请求数: {args.requests}, 并发数: {args.concurrency}, 接口权重: {args.mix}")
+
+    async with client:
+        latencies, errors, elapsed = await run_load(client, factory, args.requests, args.concurrency)
+
+    report = summarize(latencies, errors, elapsed)
+    print_report(report, elapsed)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"args": vars(args), "elapsed_seconds": elapsed, "endpoints": report},
+                      f, ensure_ascii=False, indent=2)
+        print(f"✓ 结果已保存到: {args.output}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,17 +1,203 @@
 """
 训练推荐模型
 运行：python scripts/train_model.py
+超参数搜索：python scripts/train_model.py --sweep --components 20,50,100 --algorithms randomized,arpack
+隐式反馈模式：python scripts/train_model.py --implicit（合并 /feedback 记录的点赞/点踩）
 """
 import sys
 import os
+import time
+import json
+import argparse
+import numpy as np
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
 
 # 添加项目根目录到路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from src.models.collaborative_filtering import CollaborativeFilteringRecommender
 
+# 超参数搜索子进程共享的数据（由 _init_sweep_worker 在每个进程启动时设置一次）。
+# fork 启动时以写时复制方式共享；spawn/forkserver 启动时每个进程序列化一份，
+# 因此只传训练需要的稀疏矩阵、ID 列表和验证集，不传稠密评分矩阵
+_SWEEP_IDS = None      # (user_ids, movie_ids, global_mean)
+_SWEEP_MATRIX = None
+_SWEEP_TEST = None
+
+SVD_ALGORITHMS = ('randomized', 'arpack')
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="MovieMate 模型训练")
+    parser.add_argument('--n-components', type=int, default=50,
+                        help="隐含特征数（默认50）")
+    parser.add_argument('--profile', choices=['cprofile', 'tracemalloc'], default=None,
+                        help="训练时挂载性能分析器")
+    parser.add_argument('--implicit', action='store_true',
+                        help="隐式反馈模式：合并评分和点赞/点踩，使用加权 ALS 训练")
+    parser.add_argument('--feedback', default='data/processed/feedback.jsonl',
+                        help="点赞/点踩记录（/feedback 写入的 JSONL 文件）")
+    parser.add_argument('--alpha', type=float, default=10.0,
+                        help="隐式反馈置信度系数（默认10）")
+    parser.add_argument('--iterations', type=int, default=15,
+                        help="ALS 迭代次数（默认15）")
+    parser.add_argument('--sweep', action='store_true',
+                        help="超参数搜索模式：并行训练多组参数并保存最优模型")
+    parser.add_argument('--components', default='10,20,50,100',
+                        help="搜索的隐含特征数列表，逗号分隔")
+    parser.add_argument('--algorithms', default='randomized',
+                        help="搜索的 SVD 求解器列表，逗号分隔（randomized/arpack）")
+    parser.add_argument('--test-size', type=float, default=0.2,
+                        help="留出验证集比例（默认0.2）")
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(),
+                        help="并行进程/线程数（默认CPU核数）")
+    args = parser.parse_args()
+
+    # 超参数搜索只覆盖显式评分的 SVD 模型，不能与隐式反馈模式组合
+    if args.sweep and args.implicit:
+        parser.error("--sweep 目前只支持显式评分模型，不能与 --implicit 同时使用")
+
+    # 提前校验搜索参数，避免在进程池中才报错中断整个搜索
+    algorithms = [a.strip() for a in args.algorithms.split(',')]
+    unknown = [a for a in algorithms if a not in SVD_ALGORITHMS]
+    if unknown:
+        parser.error(f"未知的 SVD 求解器: {', '.join(unknown)}（可选: {', '.join(SVD_ALGORITHMS)}）")
+    try:
+        components = [int(c) for c in args.components.split(',')]
+    except ValueError:
+        parser.error(f"--components 必须是逗号分隔的整数: {args.components}")
+    if any(c <= 0 for c in components):
+        parser.error(f"--components 必须是正整数: {args.components}")
+    if args.n_components <= 0:
+        parser.error("--n-components 必须是正整数")
+    if not 0 < args.test_size < 1:
+        parser.error(f"--test-size 必须在 0 和 1 之间（不含端点）: {args.test_size}")
+    if args.jobs < 1:
+        parser.error(f"--jobs 至少为 1: {args.jobs}")
+    return args
+
+def load_feedback(path):
+    """读取点赞/点踩记录；文件不存在时只使用评分"""
+    if not os.path.exists(path):
+        print(f"   未找到反馈记录 {path}，仅使用评分数据")
+        return None
+    feedback = pd.read_json(path, lines=True)
+    print(f"   反馈记录: {len(feedback)} 条")
+    return feedback
+
+def _init_sweep_worker(ids, sparse_matrix, test_df):
+    global _SWEEP_IDS, _SWEEP_MATRIX, _SWEEP_TEST
+    _SWEEP_IDS = ids
+    _SWEEP_MATRIX = sparse_matrix
+    _SWEEP_TEST = test_df
+
+def evaluate(model, test_df):
+    """
+    在验证集上计算 RMSE / MAE（向量化）
+
+    只评估训练集中出现过的用户和电影，coverage 为可评估样本占比。
+    """
+    user_index = {user_id: i for i, user_id in enumerate(model.user_ids)}
+    movie_index = {movie_id: i for i, movie_id in enumerate(model.movie_ids)}
+    user_idx = test_df['userId'].map(user_index)
+    movie_idx = test_df['movieId'].map(movie_index)
+    known = user_idx.notna() & movie_idx.notna()
+
+    u = user_idx[known].astype(int).to_numpy()
+    m = movie_idx[known].astype(int).to_numpy()
+    predicted = np.clip(np.einsum('ij,ij->i', model.user_factors[u], model.item_factors[m]), 1, 5)
+    errors = predicted - test_df['rating'][known].to_numpy()
+
+    return {
+        'rmse': float(np.sqrt(np.mean(errors ** 2))) if len(errors) else float('nan'),
+        'mae': float(np.mean(np.abs(errors))) if len(errors) else float('nan'),
+        'coverage': float(known.mean())
+    }
+
+def _fit_candidate(params):
+    """子进程：用共享的稀疏矩阵训练一组参数并评估"""
+    n_components, algorithm = params
+    result = {'n_components': n_components, 'algorithm': algorithm}
+
+    if n_components >= min(_SWEEP_MATRIX.shape):
+        result['error'] = f"n_components 必须小于 {min(_SWEEP_MATRIX.shape)}"
+        return result
+
+    model = CollaborativeFilteringRecommender(n_components=n_components, algorithm=algorithm)
+    model.user_ids, model.movie_ids, model.global_mean = _SWEEP_IDS
+
+    start = time.perf_counter()
+    model.fit_matrix(_SWEEP_MATRIX)
+    result['fit_seconds'] = time.perf_counter() - start
+    result['explained_variance'] = float(model.svd_model.explained_variance_ratio_.sum())
+    result.update(evaluate(model, _SWEEP_TEST))
+    return result
+
+def run_sweep(ratings, args):
+    """
+    超参数搜索
+
+    稀疏矩阵只构建一次，由进程池中各进程共享；
+    每组参数在留出集上评估，最后用最优参数在全量数据上重新训练并保存。
+    """
+    components = [int(c) for c in args.components.split(',')]
+    algorithms = [a.strip() for a in args.algorithms.split(',')]
+    grid = [(c, a) for c in components for a in algorithms]
+
+    print("\n[2] 划分训练集 / 验证集，构建稀疏评分矩阵（仅一次）...")
+    test_df = ratings.sample(frac=args.test_size, random_state=42)
+    train_df = ratings.drop(test_df.index)
+    print(f"   训练集: {len(train_df)} 条, 验证集: {len(test_df)} 条")
+    base = CollaborativeFilteringRecommender()
+    sparse_matrix = base.build_matrix(train_df)
+    print(f"   矩阵形状: {sparse_matrix.shape}, 非零元素: {sparse_matrix.nnz}")
+
+    print(f"\n[3] 并行训练 {len(grid)} 组参数（{args.jobs} 个进程）...")
+    with ProcessPoolExecutor(
+        max_workers=args.jobs,
+        initializer=_init_sweep_worker,
+        initargs=(
+            (base.user_ids, base.movie_ids, base.global_mean),
+            sparse_matrix,
+            test_df[['userId', 'movieId', 'rating']]
+        )
+    ) as executor:
+        results = list(executor.map(_fit_candidate, grid))
+
+    results_df = pd.DataFrame(results)
+    # 所有组合都失败时不会有评估列，补齐后再排序
+    for column in ('error', 'rmse'):
+        if column not in results_df:
+            results_df[column] = None
+    results_df = results_df.sort_values('rmse', na_position='last')
+
+    print("\n   搜索结果（按 RMSE 排序）:")
+    print(results_df.to_string(index=False))
+
+    os.makedirs('data/models', exist_ok=True)
+    results_path = 'data/models/sweep_results.csv'
+    results_df.to_csv(results_path, index=False)
+    print(f"\n   ✓ 搜索结果已保存到: {results_path}")
+
+    # 没有有效评分（如验证集中没有可评估样本）的组合同样视为失败，不保存模型
+    valid = results_df[results_df['error'].isna() & results_df['rmse'].notna()]
+    if valid.empty:
+        print("❌ 没有可用的参数组合")
+        sys.exit(1)
+
+    best = valid.iloc[0]
+    print(f"\n   最优参数: n_components={best['n_components']}, algorithm={best['algorithm']}"
+          f" (RMSE {best['rmse']:.4f})，在全量数据上重新训练...")
+    model = CollaborativeFilteringRecommender(
+        n_components=int(best['n_components']),
+        algorithm=best['algorithm']
+    )
+    model.fit(ratings, profile=args.profile)
+    return model
+
 def main():
+    args = parse_args()
+
     print("\n" + "=" * 60)
     print("MovieMate - 模型训练")
     print("=" * 60)
@@ -23,10 +209,26 @@ def main():
     print(f"   评分数据: {len(ratings)} 条")
     print(f"   电影数据: {len(movies)} 部")
     
+    if args.sweep:
+        model = run_sweep(ratings, args)
+        save_artifacts(model, movies)
+        return
+
     # 2. 训练模型
     print("\n[2] 开始训练...")
-    model = CollaborativeFilteringRecommender(n_components=50)
-    model.fit(ratings)
+    if args.implicit:
+        feedback = load_feedback(args.feedback)
+        model = CollaborativeFilteringRecommender(
+            n_components=args.n_components,
+            mode='implicit',
+            alpha=args.alpha,
+            iterations=args.iterations,
+            n_jobs=args.jobs
+        )
+        model.fit(ratings, profile=args.profile, feedback_df=feedback)
+    else:
+        model = CollaborativeFilteringRecommender(n_components=args.n_components)
+        model.fit(ratings, profile=args.profile)
     
     # 3. 测试模型
     print("\n[3] 测试模型...")
@@ -55,11 +257,24 @@ def main():
         movie_info = movies[movies['movieId'] == movie_id].iloc[0]
         print(f"   {i}. {movie_info['title']} (相似度: {similarity:.3f})")
     
+    save_artifacts(model, movies)
+
+def save_artifacts(model, movies):
     # 4. 保存模型
     print("\n[4] 保存模型...")
     os.makedirs('data/models', exist_ok=True)
     model.save('data/models/cf_model.pkl')
     
+    # 训练报告（各阶段耗时 / 内存 / 矩阵规模）
+    report_path = 'data/models/training_report.json'
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(model.training_report, f, ensure_ascii=False, indent=2)
+    print(f"   ✓ 训练报告已保存到: {report_path}")
+    profile_result = model.training_report.get('profile')
+    if profile_result:
+        print(f"\n   性能分析（{profile_result['mode']}）:")
+        print(profile_result['summary'])
+    
     # 5. 保存电影信息（供API使用）
     print("\n[5] 保存电影信息...")
     os.makedirs('data/processed', exist_ok=True)
@@ -2,21 +2,31 @@
 MovieMate FastAPI 应用
 运行：uvicorn src.api.main:app --reload
 """
-from fastapi import FastAPI, HTTPException
+import time
+
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
 from enum import Enum
 from datetime import datetime
-from sklearn.metrics.pairwise import cosine_similarity
 import pandas as pd
 import numpy as np
 import os
+import sys
+import json
 import random
+import threading
 
 from src.models.collaborative_filtering import CollaborativeFilteringRecommender
+from src.data.genres import GenreIndex
+
+# 模块导入耗时（启动报告用）
+_import_seconds = time.perf_counter() - _import_started
 
 # 创建应用
 app = FastAPI(
@@ -37,7 +47,15 @@ app.add_middleware(
 # 全局变量
 model = None
 movies_df = None
+genre_index = None     # 类型/年份过滤位图
+movie_lookup = {}      # movieId -> (title, genres)，用于快速补全电影信息
+startup_report = {}    # 启动耗时报告（/health 返回）
+NDJSON_BATCH_SIZE = 100  # 流式返回时每次发送的行数
 feedback_storage = []  # A/B 测试反馈存储
+# 反馈同时追加写入 JSONL 文件，供 implicit 模式训练使用
+FEEDBACK_PATH = os.environ.get("MOVIEMATE_FEEDBACK_PATH", "data/processed/feedback.jsonl")
+feedback_lock = threading.Lock()
+feedback_file = None   # 反馈文件追加句柄（首次写入时打开，进程内复用）
 
 # 推荐策略枚举
 class RecommendationStrategy(str, Enum):
@@ -68,14 +86,20 @@ class SimilarMovieResponse(BaseModel):
 @app.on_event("startup")
 async def load_model():
     """加载训练好的模型和电影数据"""
-    global model, movies_df
+    global model, movies_df, genre_index, movie_lookup, startup_report
     
     print("正在加载模型...")
     
     model_path = "data/models/cf_model.pkl"
     movies_path = "data/processed/movies.csv"
+    # 多 worker 部署：由父进程预先导出共享模型，worker 只做只读映射
+    shared_model_dir = os.environ.get("MOVIEMATE_SHARED_MODEL_DIR")
+    
+    if shared_model_dir and not os.path.exists(os.path.join(shared_model_dir, "meta.json")):
+        print("❌ 共享模型不存在！请先运行: python scripts/export_shared_model.py")
+        return
     
-    if not os.path.exists(model_path):
+    if not shared_model_dir and not os.path.exists(model_path):
         print("❌ 模型文件不存在！请先运行: python scripts/train_model.py")
         return
     
@@ -83,10 +107,83 @@ async def load_model():
         print("❌ 电影数据不存在！请先运行: python scripts/train_model.py")
         return
     
-    model = CollaborativeFilteringRecommender.load(model_path)
+    timings = {"import_seconds": _import_seconds}
+    
+    started = time.perf_counter()
+    if shared_model_dir:
+        model = CollaborativeFilteringRecommender.load_shared(shared_model_dir)
+    else:
+        model = CollaborativeFilteringRecommender.load(model_path)
+    timings["model_load_seconds"] = time.perf_counter() - started
+    # 大片库时可把 item_factors 分片并行打分
+    model.n_shards = int(os.environ.get("MOVIEMATE_SCORING_SHARDS", "1"))
+    
+    started = time.perf_counter()
     movies_df = pd.read_csv(movies_path)
+    timings["movies_load_seconds"] = time.perf_counter() - started
+    
+    started = time.perf_counter()
+    genre_index = GenreIndex(movies_df, model.movie_ids)
+    movie_lookup = dict(zip(
+        movies_df['movieId'].tolist(),
+        zip(movies_df['title'].tolist(), movies_df['genres'].tolist())
+    ))
+    timings["index_build_seconds"] = time.perf_counter() - started
+    
+    timings["total_seconds"] = sum(timings.values())
+    startup_report = {
+        "model_format": "shared" if shared_model_dir else "pickle",
+        # 精简加载路径下 sklearn 不应被导入
+        "sklearn_imported": "sklearn" in sys.modules,
+        **{name: round(seconds, 4) for name, seconds in timings.items()}
+    }
     
-    print("✓ 模型和数据加载完成！")
+    print(f"✓ 模型和数据加载完成！（耗时 {timings['total_seconds']:.2f} 秒）")
+
+def build_candidate_mask(genres, exclude_genres, year_from, year_to):
+    """根据过滤参数生成候选电影掩码，参数非法时返回 400"""
+    try:
+        return genre_index.candidate_mask(
+            genres=genres,
+            exclude_genres=exclude_genres,
+            year_from=year_from,
+            year_to=year_to
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def enrich(items, score_field):
+    """逐条补全电影标题和类型（生成器，跳过电影表中不存在的ID）"""
+    for item in items:
+        movie = movie_lookup.get(item['movieId'])
+        if movie is not None:
+            yield {
+                "movieId": item['movieId'],
+                "title": movie[0],
+                "genres": movie[1],
+                score_field: item[score_field]
+            }
+
+def ndjson_response(items):
+    """
+    以 NDJSON 流式返回结果（每行一个 JSON 对象）
+
+    直接序列化字典，跳过 response_model 的逐条 Pydantic 校验，
+    大 top_k 时首条结果可以立即发出，内存占用与结果数量无关。
+    使用异步生成器（同步生成器会让 Starlette 每行都切换一次线程池），
+    并按 NDJSON_BATCH_SIZE 行合并发送，减少 ASGI send 次数。
+    """
+    async def lines():
+        batch = []
+        for item in items:
+            batch.append(json.dumps(item, ensure_ascii=False))
+            if len(batch) >= NDJSON_BATCH_SIZE:
+                yield "\n".join(batch) + "\n"
+                batch = []
+        if batch:
+            yield "\n".join(batch) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
 # 挂载前端静态文件（如果存在）
 frontend_build_path = "frontend/build"
@@ -110,14 +207,22 @@ async def health_check():
     return {
         "status": "healthy",
         "model_loaded": model is not None,
-        "movies_loaded": movies_df is not None
+        "movies_loaded": movies_df is not None,
+        "startup": startup_report
     }
 
 @app.get("/recommend/{user_id}", response_model=List[RecommendationResponse])
 async def get_recommendations(
     user_id: int,
     top_k: int = 10,
-    exclude_rated: bool = True
+    exclude_rated: bool = True,
+    genres: Optional[List[str]] = Query(None),
+    exclude_genres: Optional[List[str]] = Query(None),
+    year_from: Optional[int] = None,
+    year_to: Optional[int] = None,
+    diversity: float = Query(0.0, ge=0.0, le=1.0),
+    max_per_genre: Optional[int] = Query(None, ge=1),
+    stream: bool = False
 ):
     """
     为用户推荐电影
@@ -126,29 +231,39 @@ async def get_recommendations(
     - user_id: 用户ID
     - top_k: 推荐数量 (默认10)
     - exclude_rated: 是否排除已评分的电影 (默认True)
+    - genres: 只推荐这些类型（可重复传入，如 genres=Comedy&genres=Drama）
+    - exclude_genres: 排除这些类型
+    - year_from / year_to: 上映年份范围
+    - diversity: 多样性权重 0~1 (默认0，即按预测评分排序)；大于0时 top_k 最多为100
+    - max_per_genre: 多样性重排时同一类型最多出现的次数（需要 diversity > 0）
+    - stream: 以 NDJSON 流式返回 (默认False)
     """
     if model is None:
         raise HTTPException(status_code=503, detail="模型未加载")
     
+    candidate_mask = build_candidate_mask(genres, exclude_genres, year_from, year_to)
+    
     # 获取推荐
-    recommendations = model.recommend(user_id, top_k=top_k, exclude_rated=exclude_rated)
+    try:
+        recommendations = model.recommend(
+            user_id,
+            top_k=top_k,
+            exclude_rated=exclude_rated,
+            candidate_mask=candidate_mask,
+            diversity=diversity,
+            item_genres=genre_index.masks,
+            max_per_genre=max_per_genre
+        )
+    except ValueError as e:
+        # 多样性参数组合不合法
+        raise HTTPException(status_code=422, detail=str(e))
     
     # 添加电影信息
-    results = []
-    for rec in recommendations:
-        movie_id = rec['movieId']
-        movie_info = movies_df[movies_df['movieId'] == movie_id]
-        
-        if not movie_info.empty:
-            movie = movie_info.iloc[0]
-            results.append({
-                "movieId": movie_id,
-                "title": movie['title'],
-                "genres": movie['genres'],
-                "predicted_rating": rec['predicted_rating']
-            })
+    results = enrich(recommendations, 'predicted_rating')
+    if stream:
+        return ndjson_response(results)
     
-    return results
+    return list(results)
 
 @app.get("/predict", response_model=PredictionResponse)
 async def predict_rating(user_id: int, movie_id: int):
@@ -181,13 +296,23 @@ async def predict_rating(user_id: int, movie_id: int):
     }
 
 @app.get("/similar/{movie_id}", response_model=List[SimilarMovieResponse])
-async def get_similar_movies(movie_id: int, top_k: int = 5):
+async def get_similar_movies(
+    movie_id: int,
+    top_k: int = 5,
+    genres: Optional[List[str]] = Query(None),
+    exclude_genres: Optional[List[str]] = Query(None),
+    year_from: Optional[int] = None,
+    year_to: Optional[int] = None,
+    stream: bool = False
+):
     """
     获取相似的电影
     
     参数:
     - movie_id: 电影ID
     - top_k: 返回数量 (默认5)
+    - genres / exclude_genres / year_from / year_to: 同 /recommend 的过滤参数
+    - stream: 以 NDJSON 流式返回 (默认False)
     """
     if model is None:
         raise HTTPException(status_code=503, detail="模型未加载")
@@ -196,25 +321,17 @@ async def get_similar_movies(movie_id: int, top_k: int = 5):
     if movie_id not in model.movie_ids:
         raise HTTPException(status_code=404, detail=f"电影ID {movie_id} 不存在于训练数据中")
     
+    candidate_mask = build_candidate_mask(genres, exclude_genres, year_from, year_to)
+    
     # 获取相似电影
-    similar = model.find_similar_movies(movie_id, top_k=top_k)
+    similar = model.find_similar_movies(movie_id, top_k=top_k, candidate_mask=candidate_mask)
     
     # 添加电影信息
-    results = []
-    for sim in similar:
-        sim_movie_id = sim['movieId']
-        movie_info = movies_df[movies_df['movieId'] == sim_movie_id]
-        
-        if not movie_info.empty:
-            movie = movie_info.iloc[0]
-            results.append({
-                "movieId": sim_movie_id,
-                "title": movie['title'],
-                "genres": movie['genres'],
-                "similarity": sim['similarity']
-            })
+    results = enrich(similar, 'similarity')
+    if stream:
+        return ndjson_response(results)
     
-    return results
+    return list(results)
 
 @app.get("/movies/{movie_id}")
 async def get_movie_info(movie_id: int):
@@ -232,12 +349,20 @@ async def get_movie_info(movie_id: int):
     }
 
 @app.get("/movies/search/{query}")
-async def search_movies(query: str, limit: int = 10):
-    """搜索电影"""
+async def search_movies(query: str, limit: int = 10, stream: bool = False):
+    """搜索电影（stream=true 时以 NDJSON 流式返回）"""
     # 简单的标题搜索
     results = movies_df[movies_df['title'].str.contains(query, case=False, na=False)]
     results = results.head(limit)
     
+    if stream:
+        return ndjson_response(
+            {"movieId": movie_id, "title": title, "genres": genres}
+            for movie_id, title, genres in zip(
+                results['movieId'].tolist(), results['title'].tolist(), results['genres'].tolist()
+            )
+        )
+    
     return results.to_dict('records')
 
 @app.get("/stats")
@@ -250,6 +375,7 @@ async def get_stats():
         "total_users": len(model.user_ids),
         "total_movies": len(model.movie_ids),
         "model_components": model.n_components,
+        "scoring_shards": model.n_shards,
         "global_mean_rating": float(model.global_mean)
     }
 
@@ -302,6 +428,34 @@ async def ab_test_recommendation(
         "recommendations": recommendations
     }
 
+def append_feedback(feedback):
+    """
+    把一条反馈追加写入 FEEDBACK_PATH
+
+    文件句柄只打开一次并保持，之后每次只是一次写入页缓存的 write，
+    不在事件循环里反复 makedirs / open。
+    """
+    global feedback_file
+    try:
+        with feedback_lock:
+            if feedback_file is None:
+                os.makedirs(os.path.dirname(FEEDBACK_PATH) or ".", exist_ok=True)
+                # 行缓冲：每条反馈写完整一行；O_APPEND 保证多 worker 追加不互相覆盖
+                feedback_file = open(FEEDBACK_PATH, "a", encoding="utf-8", buffering=1)
+            feedback_file.write(json.dumps(feedback, ensure_ascii=False) + "\n")
+    except OSError as e:
+        # 持久化失败不影响 A/B 统计
+        print(f"⚠️  反馈写入失败: {e}")
+
+@app.on_event("shutdown")
+async def close_feedback_file():
+    """关闭反馈文件句柄"""
+    global feedback_file
+    with feedback_lock:
+        if feedback_file is not None:
+            feedback_file.close()
+            feedback_file = None
+
 @app.post("/feedback")
 async def submit_feedback(
     user_id: int,
@@ -309,14 +463,18 @@ async def submit_feedback(
     liked: bool,
     strategy: str
 ):
-    """记录用户反馈用于 A/B 测试分析"""
-    feedback_storage.append({
+    """记录用户反馈用于 A/B 测试分析和隐式反馈训练"""
+    feedback = {
         "user_id": user_id,
         "movie_id": movie_id,
         "liked": liked,
         "strategy": strategy,
         "timestamp": datetime.now().isoformat()
-    })
+    }
+    feedback_storage.append(feedback)
+    
+    append_feedback(feedback)
+    
     return {"status": "success", "message": "反馈已记录"}
 
 @app.get("/ab-test/results")
@@ -371,7 +529,8 @@ async def explain_recommendation(user_id: int, movie_id: int):
 
     # 2. 计算推荐电影与用户喜欢电影的相似度
     movie_idx = model.movie_ids.index(movie_id)
-    movie_vector = model.item_factors[movie_idx].reshape(1, -1)
+    movie_vector = model.item_factors[movie_idx]
+    movie_norm = np.linalg.norm(movie_vector)
 
     similar_movies = []
     for rated_movie_id in highly_rated[:10]:  # 取前10部
@@ -379,8 +538,9 @@ async def explain_recommendation(user_id: int, movie_id: int):
             continue
 
         rated_idx = model.movie_ids.index(rated_movie_id)
-        rated_vector = model.item_factors[rated_idx].reshape(1, -1)
-        similarity = float(cosine_similarity(movie_vector, rated_vector)[0][0])
+        rated_vector = model.item_factors[rated_idx]
+        denominator = movie_norm * np.linalg.norm(rated_vector)
+        similarity = float(np.dot(movie_vector, rated_vector) / denominator) if denominator else 0.0
 
         movie_info = movies_df[movies_df['movieId'] == rated_movie_id]
         if not movie_info.empty:
@@ -0,0 +1,78 @@
+"""
+电影类型位图索引
+启动时把 movies.csv 的 genres 列（以 | 分隔）解析成与模型电影顺序对齐的位掩码，
+查询时只需一次向量化位运算即可得到候选集合
+"""
+import re
+import numpy as np
+
+NO_GENRES = '(no genres listed)'
+YEAR_PATTERN = re.compile(r'\((\d{4})\)\s*$')
+
+class GenreIndex:
+    """类型/年份过滤索引"""
+
+    def __init__(self, movies_df, movie_ids):
+        """
+        参数:
+            movies_df: DataFrame，包含 movieId, title, genres 列
+            movie_ids: 模型中的电影ID列表（决定数组顺序）
+        """
+        genre_lists = {
+            int(movie_id): [] if genres == NO_GENRES else genres.split('|')
+            for movie_id, genres in zip(movies_df['movieId'], movies_df['genres'].fillna(NO_GENRES))
+        }
+
+        self.genre_names = sorted({g for genres in genre_lists.values() for g in genres})
+        if len(self.genre_names) > 64:
+            raise ValueError(f"类型数量 {len(self.genre_names)} 超过位掩码上限 64")
+        # 类型名不区分大小写
+        self.genre_bits = {name.lower(): np.uint64(1) << np.uint64(i)
+                           for i, name in enumerate(self.genre_names)}
+
+        titles = dict(zip(movies_df['movieId'].astype(int), movies_df['title'].fillna('')))
+
+        self.masks = np.zeros(len(movie_ids), dtype=np.uint64)
+        self.years = np.zeros(len(movie_ids), dtype=np.int32)  # 0 表示未知年份
+        for idx, movie_id in enumerate(movie_ids):
+            for genre in genre_lists.get(int(movie_id), []):
+                self.masks[idx] |= self.genre_bits[genre.lower()]
+            match = YEAR_PATTERN.search(titles.get(int(movie_id), ''))
+            if match:
+                self.years[idx] = int(match.group(1))
+
+    def _bits(self, genres):
+        """把类型名列表合并成一个位掩码"""
+        bits = np.uint64(0)
+        for genre in genres:
+            key = genre.strip().lower()
+            if key not in self.genre_bits:
+                raise ValueError(f"未知类型: {genre}")
+            bits |= self.genre_bits[key]
+        return bits
+
+    def candidate_mask(self, genres=None, exclude_genres=None, year_from=None, year_to=None):
+        """
+        生成候选电影布尔掩码
+
+        参数:
+            genres: 只保留包含其中任一类型的电影
+            exclude_genres: 排除包含其中任一类型的电影
+            year_from / year_to: 上映年份范围（闭区间，未知年份会被排除）
+
+        返回:
+            与模型 movie_ids 对齐的布尔数组；没有任何过滤条件时返回 None
+        """
+        if not genres and not exclude_genres and year_from is None and year_to is None:
+            return None
+
+        mask = np.ones(len(self.masks), dtype=bool)
+        if genres:
+            mask &= (self.masks & self._bits(genres)) != 0
+        if exclude_genres:
+            mask &= (self.masks & self._bits(exclude_genres)) == 0
+        if year_from is not None:
+            mask &= self.years >= year_from
+        if year_to is not None:
+            mask &= (self.years > 0) & (self.years <= year_to)
+        return mask
@@ -1,44 +1,207 @@
 """
 基于 sklearn 的协同过滤推荐系统
-使用矩阵分解（SVD）实现
+使用矩阵分解（SVD）实现，另支持合并点赞反馈的隐式反馈 ALS 模式
+
+训练依赖（sklearn / scipy / joblib / pandas）在用到时才导入，
+API 通过 load_shared 加载模型时只需要 NumPy，冷启动更快。
 """
 import numpy as np
-import pandas as pd
-from sklearn.decomposition import TruncatedSVD
-from sklearn.metrics.pairwise import cosine_similarity
-from scipy.sparse import csr_matrix
-import joblib
+import glob
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.models.reranking import mmr_rerank
+from src.models.implicit_als import build_confidence_matrix, implicit_als
+from src.utils.profiling import PhaseTimer, profiling, peak_rss_mb
+
+MODES = ('explicit', 'implicit')
+
+# 多样性重排的候选集大小：top_k 的 CANDIDATE_POOL_FACTOR 倍，
+# 限制在 [MIN_CANDIDATE_POOL, MAX_CANDIDATE_POOL] 之间
+MIN_CANDIDATE_POOL = 200
+MAX_CANDIDATE_POOL = 500
+CANDIDATE_POOL_FACTOR = 5
+# 多样性重排允许的最大 top_k（重排开销与 top_k × 候选集大小成正比）
+MAX_DIVERSITY_TOP_K = 100
+
+# 计算热门度时每次处理的用户行数
+POPULARITY_CHUNK_ROWS = 1024
+
+# 分片打分时每个分块至少包含的电影数（太小的分块线程调度开销大于收益）
+MIN_SHARD_ROWS = 4096
+
+# 分片打分线程池，按分片数缓存（不挂在模型上，避免影响 pickle）
+_SHARD_EXECUTORS = {}
+
+def _shard_executor(n_shards):
+    """获取分片打分用的线程池"""
+    if n_shards not in _SHARD_EXECUTORS:
+        _SHARD_EXECUTORS[n_shards] = ThreadPoolExecutor(
+            max_workers=n_shards,
+            thread_name_prefix='cf-shard'
+        )
+    return _SHARD_EXECUTORS[n_shards]
+
+def _sparse_mb(matrix):
+    """CSR 矩阵占用的内存（MB）"""
+    return (matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes) / (1024 * 1024)
 
 class CollaborativeFilteringRecommender:
     """协同过滤推荐器"""
 
-    def __init__(self, n_components=50):
+    def __init__(self, n_components=50, algorithm='randomized', mode='explicit',
+                 alpha=10.0, like_weight=2.0, regularization=0.1, iterations=15, n_jobs=None,
+                 n_shards=1):
         """
         参数:
             n_components: SVD降维的维度（隐含特征数）
+            algorithm: TruncatedSVD 求解器（'randomized' 或 'arpack'）
+            mode: 'explicit' 仅用评分做 SVD；'implicit' 合并评分和点赞/点踩做加权 ALS
+            alpha / like_weight / regularization / iterations / n_jobs:
+                implicit 模式的置信度系数、单次点赞强度、正则系数、迭代次数和并行线程数
+            n_shards: 推荐打分时 item_factors 的分片数（并行线程数），1 表示不分片
         """
+        if mode not in MODES:
+            raise ValueError(f"未知的训练模式: {mode}（可选: {', '.join(MODES)}）")
         self.n_components = n_components
-        self.svd_model = TruncatedSVD(n_components=n_components, random_state=42)
+        self.algorithm = algorithm
+        self.mode = mode
+        self.alpha = alpha
+        self.like_weight = like_weight
+        self.regularization = regularization
+        self.iterations = iterations
+        self.n_jobs = n_jobs
+        self.n_shards = n_shards
+        self.svd_model = None     # TruncatedSVD，在 fit_matrix 中创建
         self.user_item_matrix = None
         self.user_ids = None
         self.movie_ids = None
         self.user_factors = None  # 用户特征矩阵
         self.item_factors = None  # 物品特征矩阵
         self.global_mean = None   # 全局平均分
+        self._item_norms = None   # 电影特征向量范数缓存（相似度计算用）
+        self._popularity_cache = None  # (平均评分, 评分次数)，冷启动推荐用
+        self.training_report = None  # fit 生成的训练报告
+        # implicit 模式下每个用户有过评分或点赞/点踩的电影（CSR 的 indptr / indices），
+        # 推荐时一并排除
+        self.interacted_indptr = None
+        self.interacted_indices = None
 
-    def fit(self, ratings_df):
+    def fit(self, ratings_df, profile=None, feedback_df=None):
         """
         训练模型
         
         参数:
             ratings_df: DataFrame，包含 userId, movieId, rating 列
+            profile: 可选的性能分析模式（'cprofile' 或 'tracemalloc'）
+            feedback_df: implicit 模式下的点赞/点踩事件，包含 user_id, movie_id, liked 列
+        
+        训练报告（各阶段耗时、峰值内存、矩阵规模）保存在 self.training_report
         """
         print("=" * 60)
         print("开始训练协同过滤模型")
         print("=" * 60)
         
-        print("\n[1] 构建用户-物品评分矩阵...")
-        # 创建数据透视表（用户-物品评分矩阵）
+        timer = PhaseTimer()
+        with profiling(profile) as profile_result:
+            print("\n[1] 构建用户-物品评分矩阵...")
+            with timer.phase('pivot') as info:
+                self._build_pivot(ratings_df)
+                if self.mode == 'implicit' and feedback_df is not None and len(feedback_df) > 0:
+                    added_users, added_movies = self._include_feedback_ids(feedback_df)
+                    info['feedback_only_users'] = added_users
+                    info['feedback_only_movies'] = added_movies
+                info['shape'] = list(self.user_item_matrix.shape)
+                info['dense_mb'] = self.user_item_matrix.values.nbytes / (1024 * 1024)
+
+            print(f"   矩阵形状: {self.user_item_matrix.shape}")
+            print(f"   用户数: {len(self.user_ids)}")
+            print(f"   电影数: {len(self.movie_ids)}")
+            print(f"   全局平均分: {self.global_mean:.2f}")
+            added = (info.get('feedback_only_users', 0), info.get('feedback_only_movies', 0))
+            if any(added):
+                print(f"   其中仅有反馈记录的用户 {added[0]} 个、电影 {added[1]} 部")
+
+            if self.mode == 'implicit':
+                print("\n[2] 合并评分和点赞反馈，构建置信度矩阵...")
+                with timer.phase('confidence') as info:
+                    sparse_matrix, dropped = build_confidence_matrix(
+                        ratings_df, feedback_df, self.user_ids, self.movie_ids,
+                        alpha=self.alpha, like_weight=self.like_weight
+                    )
+                    info['nnz'] = int(sparse_matrix.nnz)
+                    info['feedback_events'] = 0 if feedback_df is None else int(len(feedback_df))
+                    info['feedback_dropped'] = dropped
+                    info['sparse_mb'] = _sparse_mb(sparse_matrix)
+                if dropped:
+                    print(f"   忽略 {dropped} 条未知用户/电影的反馈")
+            else:
+                print("\n[2] 转换为稀疏矩阵...")
+                with timer.phase('csr') as info:
+                    sparse_matrix = self._to_sparse()
+                    info['nnz'] = int(sparse_matrix.nnz)
+                    info['sparse_mb'] = _sparse_mb(sparse_matrix)
+            print(f"   稀疏度: {1 - sparse_matrix.nnz / (sparse_matrix.shape[0] * sparse_matrix.shape[1]):.2%}")
+
+            if self.mode == 'implicit':
+                print(f"\n[3] 训练隐式反馈ALS模型（{self.n_components}个隐含特征，{self.iterations}轮）...")
+                with timer.phase('als') as info:
+                    self.fit_implicit(sparse_matrix)
+                    info['n_components'] = self.n_components
+                    info['iterations'] = self.iterations
+            else:
+                print(f"\n[3] 训练SVD模型（{self.n_components}个隐含特征）...")
+                with timer.phase('svd') as info:
+                    self.fit_matrix(sparse_matrix)
+                    info['n_components'] = self.n_components
+
+        explained_var = None
+        if self.svd_model is not None:
+            explained_var = float(self.svd_model.explained_variance_ratio_.sum())
+            print(f"   解释方差比: {explained_var:.2%}")
+        print(f"   用户特征矩阵: {self.user_factors.shape}")
+        print(f"   电影特征矩阵: {self.item_factors.shape}")
+
+        self.training_report = {
+            'mode': self.mode,
+            'n_ratings': int(len(ratings_df)),
+            'total_seconds': timer.total_seconds,
+            'process_peak_rss_mb': peak_rss_mb(),
+            'explained_variance': explained_var,
+            'phases': timer.phases,
+        }
+        if profile is not None:
+            self.training_report['profile'] = profile_result
+
+        print("\n   阶段耗时:")
+        for phase in timer.phases:
+            rss = ""
+            if phase['peak_rss_growth_mb'] is not None:
+                rss = (f", 峰值内存增长 {phase['peak_rss_growth_mb']:.0f} MB"
+                       f"（进程峰值 {phase['process_peak_rss_mb']:.0f} MB）")
+            print(f"   - {phase['phase']:<6} {phase['seconds']:.3f} 秒{rss}")
+        
+        print("\n" + "=" * 60)
+        print("✓ 模型训练完成！")
+        print("=" * 60)
+        
+        return self
+
+    def build_matrix(self, ratings_df):
+        """
+        构建用户-物品评分矩阵（不训练）
+
+        设置 user_item_matrix / user_ids / movie_ids / global_mean，
+        返回对应的稀疏矩阵，可供 fit_matrix 多次复用（如超参数搜索）。
+        """
+        self._build_pivot(ratings_df)
+        return self._to_sparse()
+
+    def _build_pivot(self, ratings_df):
+        """创建数据透视表（用户-物品评分矩阵）"""
         self.user_item_matrix = ratings_df.pivot_table(
             index='userId',
             columns='movieId',
@@ -49,34 +212,76 @@ class CollaborativeFilteringRecommender:
         self.user_ids = self.user_item_matrix.index.tolist()
         self.movie_ids = self.user_item_matrix.columns.tolist()
         self.global_mean = ratings_df['rating'].mean()
+        self._popularity_cache = None
 
-        print(f"   矩阵形状: {self.user_item_matrix.shape}")
-        print(f"   用户数: {len(self.user_ids)}")
-        print(f"   电影数: {len(self.movie_ids)}")
-        print(f"   全局平均分: {self.global_mean:.2f}")
+    def _include_feedback_ids(self, feedback_df):
+        """
+        把只出现在点赞/点踩反馈中的用户和电影并入矩阵的行列
+
+        新增的行列在评分矩阵中全为 0（没有显式评分），行列顺序与 pivot_table 一致保持升序。
+
+        返回:
+            (新增用户数, 新增电影数)
+        """
+        user_ids = sorted(set(self.user_ids) | set(feedback_df['user_id'].astype(int)))
+        movie_ids = sorted(set(self.movie_ids) | set(feedback_df['movie_id'].astype(int)))
+        added = (len(user_ids) - len(self.user_ids), len(movie_ids) - len(self.movie_ids))
+        if any(added):
+            self.user_item_matrix = self.user_item_matrix.reindex(
+                index=user_ids, columns=movie_ids, fill_value=0
+            )
+            self.user_ids = user_ids
+            self.movie_ids = movie_ids
+            self._popularity_cache = None
+        return added
+
+    def _to_sparse(self):
+        """转换为稀疏矩阵（节省内存）"""
+        from scipy.sparse import csr_matrix
 
-        # 转换为稀疏矩阵（节省内存）
-        print("\n[2] 转换为稀疏矩阵...")
-        sparse_matrix = csr_matrix(self.user_item_matrix.values)
-        print(f"   稀疏度: {1 - sparse_matrix.nnz / (sparse_matrix.shape[0] * sparse_matrix.shape[1]):.2%}")
+        return csr_matrix(self.user_item_matrix.values)
 
-        print(f"\n[3] 训练SVD模型（{self.n_components}个隐含特征）...")
+    def fit_matrix(self, sparse_matrix):
+        """在已构建好的稀疏评分矩阵上做矩阵分解"""
+        from sklearn.decomposition import TruncatedSVD
 
-        # 矩阵分解
+        self.svd_model = TruncatedSVD(
+            n_components=self.n_components,
+            algorithm=self.algorithm,
+            random_state=42
+        )
+        self._item_norms = None
         self.user_factors = self.svd_model.fit_transform(sparse_matrix)
-        self.item_factors = self.svd_model.components_.T
+        # 转成行连续，按电影切片打分时访问连续内存
+        self.item_factors = np.ascontiguousarray(self.svd_model.components_.T)
+        return self
 
-        explained_var = self.svd_model.explained_variance_ratio_.sum()
-        print(f"   解释方差比: {explained_var:.2%}")
-        print(f"   用户特征矩阵: {self.user_factors.shape}")
-        print(f"   电影特征矩阵: {self.item_factors.shape}")
-        
-        print("\n" + "=" * 60)
-        print("✓ 模型训练完成！")
-        print("=" * 60)
-        
+    def fit_implicit(self, confidence_matrix):
+        """在带符号的置信度矩阵上训练隐式反馈 ALS（见 implicit_als 模块）"""
+        self.svd_model = None
+        self._item_norms = None
+        self.interacted_indptr = confidence_matrix.indptr.copy()
+        self.interacted_indices = confidence_matrix.indices.copy()
+        self.user_factors, self.item_factors = implicit_als(
+            confidence_matrix,
+            n_factors=self.n_components,
+            regularization=self.regularization,
+            iterations=self.iterations,
+            n_jobs=self.n_jobs
+        )
         return self
 
+    def _to_rating(self, scores):
+        """
+        把模型打分换算到 1~5 分
+
+        explicit 模式的点积本身就是评分；implicit 模式的点积是偏好（约 0~1），
+        线性映射到评分区间。
+        """
+        if getattr(self, 'mode', 'explicit') == 'implicit':
+            scores = 1 + 4 * scores
+        return np.clip(scores, 1, 5)
+
     def predict_rating(self, user_id, movie_id):
         """
         预测用户对电影的评分
@@ -106,79 +311,214 @@ class CollaborativeFilteringRecommender:
         predicted = np.dot(self.user_factors[user_idx], self.item_factors[movie_idx])
         
         # 限制在1-5之间
-        return float(np.clip(predicted, 1, 5))
+        return float(self._to_rating(predicted))
 
-    def recommend(self, user_id, top_k=10, exclude_rated=True):
+    def recommend(self, user_id, top_k=10, exclude_rated=True, candidate_mask=None,
+                  diversity=0.0, item_genres=None, max_per_genre=None):
         """
         为用户推荐电影
         
         参数:
             user_id: 用户ID
             top_k: 推荐数量
-            exclude_rated: 是否排除已评分的电影
+            exclude_rated: 是否排除已评分的电影（implicit 模式下也排除点赞/点踩过的电影）
+            candidate_mask: 可选的候选电影布尔掩码（与 movie_ids 对齐），
+                            为 False 的电影不会出现在结果中
+            diversity: 多样性权重 0~1；大于 0 时在候选集上做 MMR 重排
+                       （此时 top_k 不能超过 MAX_DIVERSITY_TOP_K）
+            item_genres: 可选的电影类型位掩码（与 movie_ids 对齐），用于类型覆盖约束
+            max_per_genre: 重排时同一类型最多出现的次数，只能与 diversity > 0 一起使用
             
         返回:
             推荐电影ID列表和预测评分
         """
+        if diversity > 0 and top_k > MAX_DIVERSITY_TOP_K:
+            raise ValueError(f"多样性重排时 top_k 不能超过 {MAX_DIVERSITY_TOP_K}")
+        if max_per_genre is not None and diversity <= 0:
+            raise ValueError("max_per_genre 只在 diversity > 0 时生效")
+        
         if user_id not in self.user_ids:
             # 新用户：返回热门电影
-            return self._recommend_popular(top_k)
+            return self._recommend_popular(
+                top_k,
+                candidate_mask=candidate_mask,
+                diversity=diversity,
+                item_genres=item_genres,
+                max_per_genre=max_per_genre
+            )
         
         user_idx = self.user_ids.index(user_id)
         
-        # 预测所有电影的评分
-        user_vector = self.user_factors[user_idx]
-        predicted_ratings = np.dot(user_vector, self.item_factors.T)
-        
-        # 如果排除已评分的电影
+        # 不参与排序的电影：已评分的和被过滤掉的
+        blocked = None
         if exclude_rated:
-            rated_movies = self.user_item_matrix.iloc[user_idx]
-            rated_indices = np.where(rated_movies > 0)[0]
-            predicted_ratings[rated_indices] = -np.inf
+            blocked = np.asarray(self.user_item_matrix.iloc[user_idx]) > 0
+            indptr = getattr(self, 'interacted_indptr', None)
+            if indptr is not None:
+                # implicit 模式：点赞/点踩过的电影也不再推荐
+                blocked[self.interacted_indices[indptr[user_idx]:indptr[user_idx + 1]]] = True
+        if candidate_mask is not None:
+            blocked = ~candidate_mask if blocked is None else blocked | ~candidate_mask
         
         # 获取top-k
-        top_indices = np.argsort(predicted_ratings)[::-1][:top_k]
+        user_vector = self.user_factors[user_idx]
+        if diversity > 0:
+            # 先取候选集，再在候选集上做多样性重排
+            pool, pool_scores = self._score_top_k(user_vector, self._candidate_pool_size(top_k), blocked)
+            order = self._rerank(pool, pool_scores, top_k, diversity, item_genres, max_per_genre)
+            top_indices, top_scores = pool[order], pool_scores[order]
+        else:
+            top_indices, top_scores = self._score_top_k(user_vector, top_k, blocked)
         
         recommendations = []
-        for idx in top_indices:
+        for idx, rating in zip(top_indices, top_scores):
             movie_id = self.movie_ids[idx]
-            rating = predicted_ratings[idx]
             recommendations.append({
                 'movieId': int(movie_id),
-                'predicted_rating': float(np.clip(rating, 1, 5))
+                'predicted_rating': float(self._to_rating(rating))
             })
         
         return recommendations
 
-    def _recommend_popular(self, top_k):
-        """推荐热门电影（用于冷启动）"""
-        # 计算每部电影的平均评分和评分次数
-        avg_ratings = self.user_item_matrix.replace(0, np.nan).mean(axis=0)
-        rating_counts = (self.user_item_matrix > 0).sum(axis=0)
+    @staticmethod
+    def _candidate_pool_size(top_k):
+        """多样性重排的候选集大小"""
+        return min(max(MIN_CANDIDATE_POOL, top_k * CANDIDATE_POOL_FACTOR), MAX_CANDIDATE_POOL)
+
+    def _rerank(self, pool, pool_scores, top_k, diversity, item_genres=None, max_per_genre=None):
+        """在候选集（电影下标 pool）上做 MMR 重排，返回候选集内的顺序"""
+        return mmr_rerank(
+            pool_scores,
+            self.item_factors[pool],
+            top_k,
+            diversity=diversity,
+            item_genres=item_genres[pool] if item_genres is not None else None,
+            max_per_genre=max_per_genre
+        )
+
+    def _score_top_k(self, user_vector, top_k, blocked=None):
+        """
+        预测用户对所有电影的评分并取 top-k
+
+        n_shards > 1 且电影数足够多时，把 item_factors 按行切成连续分块，
+        在线程池中并行打分（NumPy 矩阵运算会释放 GIL），每块各取 top-k 后再合并。
+
+        参数:
+            user_vector: 用户特征向量
+            top_k: 返回数量
+            blocked: 可选的布尔数组，为 True 的电影不参与排序
+
+        返回:
+            (电影下标数组, 对应的预测分数数组)，按分数降序
+        """
+        n_items = len(self.item_factors)
+        n_shards = min(getattr(self, 'n_shards', 1), max(1, n_items // MIN_SHARD_ROWS))
+        
+        if n_shards <= 1:
+            return self._score_block(user_vector, 0, n_items, top_k, blocked)
+        
+        bounds = np.linspace(0, n_items, n_shards + 1, dtype=int)
+        executor = _shard_executor(n_shards)
+        futures = [
+            executor.submit(self._score_block, user_vector, start, end, top_k, blocked)
+            for start, end in zip(bounds[:-1], bounds[1:])
+        ]
+        results = [future.result() for future in futures]
+        
+        # 合并各分块的 top-k
+        indices = np.concatenate([r[0] for r in results])
+        scores = np.concatenate([r[1] for r in results])
+        order = self._top_k_indices(scores, top_k)
+        return indices[order], scores[order]
+
+    def _score_block(self, user_vector, start, end, top_k, blocked=None):
+        """对第 start~end 部电影打分并取该块的 top-k（返回全局下标）"""
+        scores = np.dot(self.item_factors[start:end], user_vector)
+        if blocked is not None:
+            scores[blocked[start:end]] = -np.inf
+        top = self._top_k_indices(scores, top_k)
+        return top + start, scores[top]
+
+    @staticmethod
+    def _top_k_indices(scores, top_k):
+        """
+        取分数最高的 top_k 个下标（降序）
+
+        先用 argpartition 选出候选再排序，避免对整个数组排序；
+        被过滤掉的（-inf）下标不会返回。
+        """
+        top_k = min(top_k, len(scores))
+        if top_k <= 0:
+            return np.array([], dtype=int)
+        
+        if top_k < len(scores):
+            candidates = np.argpartition(scores, -top_k)[-top_k:]
+        else:
+            candidates = np.arange(len(scores))
+        top_indices = candidates[np.argsort(scores[candidates])[::-1]]
+        return top_indices[np.isfinite(scores[top_indices])]
+
+    def _recommend_popular(self, top_k, candidate_mask=None, diversity=0.0,
+                           item_genres=None, max_per_genre=None):
+        """推荐热门电影（用于冷启动），多样性参数同 recommend"""
+        # 每部电影的平均评分和评分次数（只计算一次）
+        avg_ratings, rating_counts = self._popularity()
         
         # 过滤掉评分次数太少的电影（至少10个评分）
         mask = rating_counts >= 10
-        filtered_ratings = avg_ratings[mask]
+        if candidate_mask is not None:
+            mask &= candidate_mask
+        scores = np.where(mask, avg_ratings, -np.inf)
         
         # 获取top-k
-        top_movies = filtered_ratings.nlargest(top_k)
+        if diversity > 0:
+            pool = self._top_k_indices(scores, self._candidate_pool_size(top_k))
+            order = self._rerank(pool, scores[pool], top_k, diversity, item_genres, max_per_genre)
+            top_indices = pool[order]
+        else:
+            top_indices = self._top_k_indices(scores, top_k)
         
         recommendations = []
-        for movie_id, rating in top_movies.items():
+        for idx in top_indices:
             recommendations.append({
-                'movieId': int(movie_id),
-                'predicted_rating': float(rating)
+                'movieId': int(self.movie_ids[idx]),
+                'predicted_rating': float(avg_ratings[idx])
             })
         
         return recommendations
 
-    def find_similar_movies(self, movie_id, top_k=5):
+    def _popularity(self):
+        """
+        每部电影的平均评分和评分次数（与 movie_ids 对齐）
+
+        首次使用时按行分块计算并缓存，不会生成与评分矩阵同样大小的临时矩阵；
+        共享模型直接映射 export_shared 预先导出的结果。
+        """
+        cached = getattr(self, '_popularity_cache', None)
+        if cached is not None:
+            return cached
+        
+        values = self.user_item_matrix.values
+        sums = np.zeros(values.shape[1])
+        counts = np.zeros(values.shape[1], dtype=np.int64)
+        for start in range(0, values.shape[0], POPULARITY_CHUNK_ROWS):
+            block = values[start:start + POPULARITY_CHUNK_ROWS]
+            sums += block.sum(axis=0)
+            counts += (block > 0).sum(axis=0)
+        
+        with np.errstate(invalid='ignore', divide='ignore'):
+            avg_ratings = np.where(counts > 0, sums / counts, np.nan)
+        self._popularity_cache = (avg_ratings, counts)
+        return self._popularity_cache
+
+    def find_similar_movies(self, movie_id, top_k=5, candidate_mask=None):
         """
         找到相似的电影
         
         参数:
             movie_id: 电影ID
             top_k: 返回数量
+            candidate_mask: 可选的候选电影布尔掩码（与 movie_ids 对齐）
             
         返回:
             相似电影列表
@@ -189,14 +529,15 @@ class CollaborativeFilteringRecommender:
         movie_idx = self.movie_ids.index(movie_id)
         
         # 计算余弦相似度
-        movie_vector = self.item_factors[movie_idx].reshape(1, -1)
-        similarities = cosine_similarity(movie_vector, self.item_factors)[0]
+        similarities = self.cosine_similarities(self.item_factors[movie_idx])
         
-        # 排除自己
-        similarities[movie_idx] = -1
+        # 排除自己和被过滤的电影
+        similarities[movie_idx] = -np.inf
+        if candidate_mask is not None:
+            similarities[~candidate_mask] = -np.inf
         
         # 获取最相似的
-        top_indices = np.argsort(similarities)[::-1][:top_k]
+        top_indices = self._top_k_indices(similarities, top_k)
         
         similar_movies = []
         for idx in top_indices:
@@ -207,14 +548,138 @@ class CollaborativeFilteringRecommender:
         
         return similar_movies
 
+    def cosine_similarities(self, vector):
+        """
+        计算向量与所有电影特征向量的余弦相似度（纯 NumPy，不依赖 sklearn）
+
+        电影向量的范数只在首次调用时计算并缓存。
+        """
+        item_norms = getattr(self, '_item_norms', None)
+        if item_norms is None:
+            item_norms = np.linalg.norm(self.item_factors, axis=1)
+            self._item_norms = item_norms
+
+        denominator = item_norms * np.linalg.norm(vector)
+        # 零向量的相似度按 0 处理（与 sklearn 一致）
+        denominator[denominator == 0] = 1.0
+        return np.dot(self.item_factors, vector) / denominator
+
     def save(self, filepath):
         """保存模型"""
+        import joblib
+
         joblib.dump(self, filepath)
         print(f"✓ 模型已保存到: {filepath}")
     
     @staticmethod
     def load(filepath):
-        """加载模型"""
+        """加载模型（pickle 格式，需要安装训练依赖）"""
+        import joblib
+
         model = joblib.load(filepath)
         print(f"✓ 模型已加载: {filepath}")
+        return model
+
+    def export_shared(self, dirpath):
+        """
+        导出为共享内存布局（每个数组一个 .npy 文件）
+
+        多个 worker 用 mmap 只读方式映射同一组文件，
+        物理内存只由操作系统页缓存保留一份。
+
+        每次导出写入新的版本目录（dirpath.v<时间戳>），写完后原子地把 dirpath
+        符号链接切换过去。已映射旧文件的 worker 不受影响（旧文件只会被删除、
+        不会被原地截断，避免 SIGBUS）。
+
+        参数:
+            dirpath: 导出目录（符号链接，指向当前版本）
+        """
+        dirpath = os.path.abspath(dirpath.rstrip(os.sep))
+        version_dir = f"{dirpath}.v{time.time_ns()}"
+        os.makedirs(version_dir)
+
+        arrays = {
+            'user_factors': self.user_factors,
+            'item_factors': self.item_factors,
+            'user_item_matrix': self.user_item_matrix.values,
+            'user_ids': np.asarray(self.user_ids),
+            'movie_ids': np.asarray(self.movie_ids),
+        }
+        # 预先算好热门度，worker 的冷启动推荐不必扫描整个评分矩阵
+        arrays['popularity_avg'], arrays['popularity_count'] = self._popularity()
+        if getattr(self, 'interacted_indptr', None) is not None:
+            arrays['interacted_indptr'] = self.interacted_indptr
+            arrays['interacted_indices'] = self.interacted_indices
+        for name, array in arrays.items():
+            # 保证 C 连续，映射后按行切片不会触发复制
+            np.save(os.path.join(version_dir, f"{name}.npy"), np.ascontiguousarray(array))
+
+        meta = {
+            'n_components': self.n_components,
+            'mode': getattr(self, 'mode', 'explicit'),
+            'global_mean': float(self.global_mean),
+            'training_report': getattr(self, 'training_report', None),
+        }
+        with open(os.path.join(version_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+
+        # 旧版本的导出目录是普通目录，先整体改名移开（改名不影响已映射的文件）
+        if os.path.isdir(dirpath) and not os.path.islink(dirpath):
+            os.rename(dirpath, f"{dirpath}.v0")
+
+        # 原子切换符号链接
+        tmp_link = f"{dirpath}.tmp-{os.getpid()}"
+        os.symlink(os.path.basename(version_dir), tmp_link)
+        os.replace(tmp_link, dirpath)
+
+        # 清理旧版本：删除（unlink）不会影响仍在映射这些文件的进程
+        for old_dir in glob.glob(f"{glob.escape(dirpath)}.v*"):
+            if old_dir != version_dir:
+                shutil.rmtree(old_dir, ignore_errors=True)
+
+        print(f"✓ 共享模型已导出到: {dirpath} -> {os.path.basename(version_dir)}")
+
+    @staticmethod
+    def load_shared(dirpath):
+        """
+        以只读 mmap 方式加载 export_shared 导出的模型
+
+        返回的模型中所有矩阵都是映射文件上的 NumPy 视图，
+        不会在当前进程中复制数据；加载过程不需要 sklearn。
+        """
+        import pandas as pd
+
+        # 先解析符号链接，保证所有文件来自同一个导出版本
+        dirpath = os.path.realpath(dirpath)
+
+        with open(os.path.join(dirpath, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+
+        def _load(name):
+            return np.load(os.path.join(dirpath, f"{name}.npy"), mmap_mode='r')
+
+        model = CollaborativeFilteringRecommender(
+            n_components=meta['n_components'],
+            mode=meta.get('mode', 'explicit')
+        )
+        model.global_mean = meta['global_mean']
+        model.training_report = meta.get('training_report')
+        model.user_ids = _load('user_ids').tolist()
+        model.movie_ids = _load('movie_ids').tolist()
+        model.user_factors = _load('user_factors')
+        if os.path.exists(os.path.join(dirpath, 'interacted_indptr.npy')):
+            model.interacted_indptr = _load('interacted_indptr')
+            model.interacted_indices = _load('interacted_indices')
+        model.item_factors = _load('item_factors')
+        if os.path.exists(os.path.join(dirpath, 'popularity_avg.npy')):
+            model._popularity_cache = (_load('popularity_avg'), _load('popularity_count'))
+        # copy=False：DataFrame 直接包装映射数组
+        model.user_item_matrix = pd.DataFrame(
+            _load('user_item_matrix'),
+            index=model.user_ids,
+            columns=model.movie_ids,
+            copy=False
+        )
+
+        print(f"✓ 共享模型已映射: {dirpath}")
         return model
\ No newline at end of file
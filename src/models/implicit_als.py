@@ -0,0 +1,151 @@
+"""
+隐式反馈矩阵分解（加权交替最小二乘，implicit ALS）
+参考 Hu, Koren, Volinsky: Collaborative Filtering for Implicit Feedback Datasets
+
+偏好 p_ui ∈ {0, 1}，置信度 c_ui = 1 + alpha * |信号强度|。
+每一步只用到稀疏矩阵的非零项和 k×k 的 YᵀY，不会构造稠密的置信度矩阵。
+"""
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+# 显式评分相对中性分的偏移作为信号强度（3.0 为中性）
+NEUTRAL_RATING = 3.0
+
+# 批量求解时补齐后的 (行数, 最长行, k) 因子数组以及 (行数, k, k) 系数矩阵的元素数上限（约 64 MB）
+PADDED_BUFFER_ELEMENTS = 8 * 1024 * 1024
+
+def build_confidence_matrix(ratings_df, feedback_df, user_ids, movie_ids,
+                            alpha=10.0, like_weight=2.0):
+    """
+    合并显式评分和点赞/点踩事件，构建带符号的置信度稀疏矩阵
+
+    同一 (用户, 电影) 的所有信号强度先求和：评分贡献 rating - 3.0，
+    点赞 +like_weight，点踩 -like_weight。结果矩阵中的值为
+    ±(1 + alpha * |强度|)，正号表示偏好为 1，负号表示偏好为 0。
+
+    参数:
+        ratings_df: DataFrame，包含 userId, movieId, rating 列
+        feedback_df: DataFrame，包含 user_id, movie_id, liked 列（可为 None）
+        user_ids / movie_ids: 矩阵的行列顺序；不在其中的反馈会被忽略
+        alpha: 置信度缩放系数
+        like_weight: 一次点赞/点踩的信号强度
+
+    返回:
+        (csr_matrix, 被忽略的反馈条数)
+    """
+    from scipy.sparse import coo_matrix
+
+    user_index = {user_id: i for i, user_id in enumerate(user_ids)}
+    movie_index = {movie_id: i for i, movie_id in enumerate(movie_ids)}
+
+    rows = [ratings_df['userId'].map(user_index).to_numpy()]
+    cols = [ratings_df['movieId'].map(movie_index).to_numpy()]
+    strengths = [ratings_df['rating'].to_numpy(dtype=float) - NEUTRAL_RATING]
+
+    dropped = 0
+    if feedback_df is not None and len(feedback_df) > 0:
+        fb_rows = feedback_df['user_id'].map(user_index)
+        fb_cols = feedback_df['movie_id'].map(movie_index)
+        known = (fb_rows.notna() & fb_cols.notna()).to_numpy()
+        dropped = int((~known).sum())
+        rows.append(fb_rows[known].to_numpy())
+        cols.append(fb_cols[known].to_numpy())
+        liked = feedback_df['liked'].to_numpy(dtype=bool)[known]
+        strengths.append(np.where(liked, like_weight, -like_weight))
+
+    # coo -> csr 时重复的 (用户, 电影) 会自动求和
+    strength = coo_matrix(
+        (np.concatenate(strengths), (np.concatenate(rows).astype(int), np.concatenate(cols).astype(int))),
+        shape=(len(user_ids), len(movie_ids))
+    ).tocsr()
+
+    confidence = strength.copy()
+    confidence.data = np.where(strength.data > 0, 1.0, -1.0) * (1.0 + alpha * np.abs(strength.data))
+    return confidence, dropped
+
+def _solve_rows(signed_confidence, fixed, start, end, regularization, gram):
+    """
+    求解第 start~end 行的因子（固定另一侧因子）
+
+    非空行按交互数排序后分批，每批把各行的交互补齐到相同长度，
+    用批量 matmul 累加 Yᵀ(Cu - I)Y，再调用一次批量 np.linalg.solve，
+    不再逐行循环。没有任何交互的行保持为 0。
+    """
+    n_factors = fixed.shape[1]
+    result = np.zeros((end - start, n_factors))
+    base = gram + regularization * np.eye(n_factors)
+    indptr, indices, data = signed_confidence.indptr, signed_confidence.indices, signed_confidence.data
+
+    lengths = np.diff(indptr[start:end + 1])
+    rows = np.flatnonzero(lengths)
+    rows = rows[np.argsort(lengths[rows], kind='stable')]
+    sorted_lengths = lengths[rows]
+    max_entries = max(1, PADDED_BUFFER_ELEMENTS // n_factors)
+    max_batch_rows = max(1, PADDED_BUFFER_ELEMENTS // (n_factors * n_factors))
+
+    pos = 0
+    while pos < len(rows):
+        # 行长度升序，补齐后的大小 = 行数 × 本批最长行；同时限制 (行数, k, k) 的 A 的大小。
+        # 单行超出上限时单独成批
+        tail = sorted_lengths[pos:pos + max_batch_rows]
+        padded = np.arange(1, len(tail) + 1) * tail
+        stop = pos + max(1, int(np.searchsorted(padded, max_entries, side='right')))
+        batch = rows[pos:stop]
+        width = sorted_lengths[stop - 1]
+
+        offsets = np.arange(width)
+        valid = offsets < lengths[batch][:, None]
+        positions = np.where(valid, indptr[start + batch][:, None] + offsets, indptr[start + batch][:, None])
+        factors = fixed[indices[positions]]                      # (行数, width, k)
+        values = data[positions]
+        confidence = np.where(valid, np.abs(values), 0.0)
+        preference = valid & (values > 0)
+
+        # A = YᵀY + Yᵀ(Cu - I)Y + λI,  b = YᵀCu p（补齐的位置权重为 0）
+        factors_t = factors.transpose(0, 2, 1)
+        a = base + np.matmul(factors_t * np.where(valid, confidence - 1.0, 0.0)[:, None, :], factors)
+        b = np.matmul(factors_t, np.where(preference, confidence, 0.0)[..., None])
+        result[batch] = np.linalg.solve(a, b)[..., 0]
+        pos = stop
+    return result
+
+def _solve_side(signed_confidence, fixed, regularization, executor, n_blocks):
+    """按行分块，在线程池中并行求解（NumPy 线性代数运算会释放 GIL）"""
+    gram = fixed.T @ fixed
+    n_rows = signed_confidence.shape[0]
+    bounds = np.linspace(0, n_rows, n_blocks + 1, dtype=int)
+    futures = [
+        executor.submit(_solve_rows, signed_confidence, fixed, start, end, regularization, gram)
+        for start, end in zip(bounds[:-1], bounds[1:]) if end > start
+    ]
+    return np.vstack([future.result() for future in futures])
+
+def implicit_als(signed_confidence, n_factors=50, regularization=0.1, iterations=15,
+                 n_jobs=None, random_state=42):
+    """
+    训练隐式反馈 ALS 模型
+
+    参数:
+        signed_confidence: build_confidence_matrix 返回的稀疏矩阵（用户 × 电影）
+        n_factors: 隐含特征数
+        regularization: L2 正则系数
+        iterations: 交替迭代次数
+        n_jobs: 并行线程数（默认CPU核数）
+
+    返回:
+        (user_factors, item_factors)
+    """
+    n_jobs = n_jobs or os.cpu_count() or 1
+    rng = np.random.default_rng(random_state)
+    n_users, n_items = signed_confidence.shape
+    user_factors = rng.normal(scale=0.01, size=(n_users, n_factors))
+    item_factors = rng.normal(scale=0.01, size=(n_items, n_factors))
+    item_view = signed_confidence.T.tocsr()
+
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        for _ in range(iterations):
+            user_factors = _solve_side(signed_confidence, item_factors, regularization, executor, n_jobs)
+            item_factors = _solve_side(item_view, user_factors, regularization, executor, n_jobs)
+
+    return user_factors, item_factors
@@ -0,0 +1,70 @@
+"""
+推荐结果重排序
+在候选集（通常几百部电影）上做多样性重排，避免推荐列表全是高度相似的电影
+"""
+import numpy as np
+
+def mmr_rerank(scores, item_vectors, top_k, diversity=0.3, item_genres=None, max_per_genre=None):
+    """
+    最大边际相关性（MMR）重排序
+
+    每一步选择 (1 - diversity) * 相关性 - diversity * 与已选电影的最大相似度 最高的电影。
+    每一步只计算新选电影与候选集的相似度（一次矩阵-向量乘法），
+    不构造 n×n 相似度矩阵，内存与候选集大小成正比。
+
+    参数:
+        scores: 候选电影的预测分数，形状 (n,)
+        item_vectors: 候选电影的特征向量，形状 (n, d)
+        top_k: 返回数量
+        diversity: 多样性权重 0~1，0 等价于按分数排序
+        item_genres: 可选，候选电影的类型位掩码（uint64），用于类型覆盖约束
+        max_per_genre: 可选，同一类型最多出现的次数；达到上限的类型不再入选，
+                       除非已经没有其他候选
+
+    返回:
+        重排后的候选下标（相对于输入数组）
+    """
+    n = len(scores)
+    top_k = min(top_k, n)
+    if top_k <= 0:
+        return np.array([], dtype=int)
+
+    # 相关性归一化到 [0, 1]，与余弦相似度处于同一量纲
+    relevance = np.asarray(scores, dtype=float)
+    spread = relevance.max() - relevance.min()
+    relevance = (relevance - relevance.min()) / spread if spread > 0 else np.ones(n)
+
+    norms = np.linalg.norm(item_vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    unit_vectors = item_vectors / norms
+
+    use_genres = item_genres is not None and max_per_genre is not None
+    if use_genres:
+        item_genres = np.asarray(item_genres, dtype=np.uint64)
+        genre_counts = np.zeros(64, dtype=int)
+        bit_values = np.uint64(1) << np.arange(64, dtype=np.uint64)
+        saturated = np.uint64(0)
+
+    max_similarity = np.zeros(n)
+    available = np.ones(n, dtype=bool)
+    selected = []
+
+    for _ in range(top_k):
+        mmr = (1 - diversity) * relevance - diversity * max_similarity
+        mmr[~available] = -np.inf
+
+        if use_genres:
+            eligible = available & ((item_genres & saturated) == 0)
+            if eligible.any():
+                mmr[~eligible] = -np.inf
+
+        best = int(np.argmax(mmr))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_similarity, unit_vectors @ unit_vectors[best], out=max_similarity)
+
+        if use_genres:
+            genre_counts += (item_genres[best] & bit_values) != 0
+            saturated = np.bitwise_or.reduce(bit_values[genre_counts >= max_per_genre], initial=np.uint64(0))
+
+    return np.array(selected, dtype=int)
@@ -0,0 +1,105 @@
+"""
+训练过程性能分析工具
+分阶段记录耗时和内存峰值，并可选挂载 cProfile / tracemalloc
+"""
+import io
+import sys
+import time
+import pstats
+import cProfile
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块
+    resource = None
+
+PROFILE_MODES = ('cprofile', 'tracemalloc')
+
+def peak_rss_mb():
+    """进程至今的峰值常驻内存（MB），不支持的平台返回 None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位是 KB，macOS 是字节
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+class PhaseTimer:
+    """分阶段计时器"""
+
+    def __init__(self):
+        self.phases = []
+
+    @contextmanager
+    def phase(self, name):
+        """
+        记录一个阶段的耗时和内存
+
+        - peak_rss_growth_mb: 该阶段使进程峰值内存（ru_maxrss）上升了多少，
+          用于比较各阶段的内存开销；峰值低于之前阶段的阶段记为 0
+        - process_peak_rss_mb: 阶段结束时进程至今的峰值内存（累计值）
+
+        用法:
+            with timer.phase('svd') as info:
+                ...
+                info['nnz'] = matrix.nnz   # 附加该阶段的统计信息
+        """
+        info = {}
+        rss_before = peak_rss_mb()
+        started = time.perf_counter()
+        yield info
+        seconds = time.perf_counter() - started
+        rss_after = peak_rss_mb()
+        self.phases.append({
+            'phase': name,
+            'seconds': seconds,
+            'peak_rss_growth_mb': None if rss_after is None else rss_after - rss_before,
+            'process_peak_rss_mb': rss_after,
+            **info
+        })
+
+    @property
+    def total_seconds(self):
+        return sum(p['seconds'] for p in self.phases)
+
+@contextmanager
+def profiling(mode=None, top=15):
+    """
+    可选的性能分析钩子
+
+    参数:
+        mode: None / 'cprofile' / 'tracemalloc'
+        top: 汇总中保留的条目数
+
+    产出一个字典，退出上下文后其中的 'summary' 为文本形式的分析结果
+    """
+    result = {'mode': mode}
+    if mode is None:
+        yield result
+        return
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"未知的分析模式: {mode}（可选: {', '.join(PROFILE_MODES)}）")
+
+    if mode == 'cprofile':
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield result
+        finally:
+            profiler.disable()
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(top)
+            result['summary'] = stream.getvalue()
+    else:
+        tracemalloc.start()
+        try:
+            yield result
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            result['peak_traced_mb'] = peak / (1024 * 1024)
+            result['summary'] = '\n'.join(
+                str(stat) for stat in snapshot.statistics('lineno')[:top]
+            )
@@ -17,5 +17,13 @@ if [ ! -f "data/models/cf_model.pkl" ]; then
 fi
 
 # 启动 API 服务
-echo "🚀 启动 API 服务..."
-uvicorn src.api.main:app --host 0.0.0.0 --port 8000
+WORKERS=${WORKERS:-1}
+echo "🚀 启动 API 服务（${WORKERS} 个 worker）..."
+
+if [ "$WORKERS" -gt 1 ]; then
+    # 父进程只加载一次模型，worker 共享映射的矩阵
+    python scripts/export_shared_model.py data/models/cf_model.pkl data/models/shared || exit 1
+    export MOVIEMATE_SHARED_MODEL_DIR=data/models/shared
+fi
+
+uvicorn src.api.main:app --host 0.0.0.0 --port 8000 --workers "$WORKERS"